@@ -0,0 +1,134 @@
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Allow imports from the parent directory
+dir_abspath = os.path.dirname(__file__)
+parent_dir_abspath = os.path.dirname(dir_abspath)
+sys.path.append(parent_dir_abspath)
+
+from compute_reorg_attack_probability.run import (
+    build_reorg_probability_table,
+    compute_reorg_attack_probability,
+    get_reorg_attack_probability,
+    load_reorg_probability_table,
+    logger,
+)
+
+
+def benchmark(
+    n_queries: int = 100_000,
+    n_distinct_queries: int = 2000,
+    q_resolution: int = 1000,
+    z_max: int = 50,
+) -> None:
+    """
+    Compare the latency of reorg attack probability queries computed on each
+    call to the latency of lookups in a precomputed table, both direct and
+    through compute_reorg_attack_probability (which the service calls, and
+    which also checks the table file on each call). As in production, the
+    queries are drawn from a limited set of (q, z) pairs.
+    """
+    random.seed(0)
+    distinct_queries = [
+        (
+            random.randrange(q_resolution // 2) / q_resolution,
+            random.randrange(z_max + 1),
+            random.choice(("original", "modified")),
+        )
+        for _ in range(n_distinct_queries)
+    ]
+    queries = random.choices(distinct_queries, k=n_queries)
+    off_grid_queries = [
+        (q + 0.5 / q_resolution, z, formula) for q, z, formula in queries
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        table_path = os.path.join(tmp_dir, "reorg_probabilities.bin")
+
+        start_time = time.perf_counter()
+        build_reorg_probability_table(table_path, q_resolution, z_max)
+        build_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        table = load_reorg_probability_table(table_path)
+        load_time = time.perf_counter() - start_time
+
+        # Only time the queries, not the logging of each result
+        logger.setLevel(logging.WARNING)
+        timings = {}
+        for name, query_function, query_set in (
+            ("per-call loop", get_reorg_attack_probability, queries),
+            ("table (on grid)", table.lookup, queries),
+            (
+                "table (interpolated)",
+                lambda q, z, formula: table.lookup(
+                    q, z, formula, interpolate=True
+                ),
+                off_grid_queries,
+            ),
+            ("table (exact fallback)", table.lookup, off_grid_queries),
+            (
+                "entry point (on grid)",
+                lambda q, z, formula: compute_reorg_attack_probability(
+                    q, z, formula, table_path
+                ),
+                queries,
+            ),
+            (
+                "entry point (interpolated)",
+                lambda q, z, formula: compute_reorg_attack_probability(
+                    q, z, formula, table_path, interpolate=True
+                ),
+                off_grid_queries,
+            ),
+        ):
+            start_time = time.perf_counter()
+            for q, z, formula in query_set:
+                query_function(q, z, formula)
+            timings[name] = (time.perf_counter() - start_time) / len(query_set)
+
+        # Interpolation errors over the distinct off-grid queries, by q range
+        # since the relative error grows as q (and the probability) get small
+        max_abs_error = 0
+        max_rel_errors = {"q < 0.01": 0, "0.01 <= q < 0.05": 0, "q >= 0.05": 0}
+        for q, z, formula in off_grid_queries[:n_distinct_queries]:
+            exact = get_reorg_attack_probability(q, z, formula)
+            error = abs(table.lookup(q, z, formula, interpolate=True) - exact)
+            max_abs_error = max(max_abs_error, error)
+            # The exact computation (1 minus a sum) has an absolute error
+            # around 1e-16, so smaller probabilities are rounding noise
+            if exact > 1e-12:
+                q_range = (
+                    "q < 0.01"
+                    if q < 0.01
+                    else "0.01 <= q < 0.05" if q < 0.05 else "q >= 0.05"
+                )
+                max_rel_errors[q_range] = max(
+                    max_rel_errors[q_range], error / exact
+                )
+
+    print(
+        "\n#################\n"
+        "### Benchmark ###\n"
+        "#################\n"
+        f"{'Table build time:':<32}{build_time:.3f} seconds\n"
+        f"{'Table load time:':<32}{load_time * 1e6:.1f} µs\n"
+        f"{'Max interpolation error:':<32}{max_abs_error:.2e} (absolute)\n"
+        + "".join(
+            f"{'   relative*, ' + q_range + ':':<32}{rel_error:.2%}\n"
+            for q_range, rel_error in max_rel_errors.items()
+        )
+        + f"{'   (* probabilities > 1e-12)'}\n"
+        f"{'Query':<32}{'Latency (µs)'}\n"
+        f"{'-'*44}"
+    )
+    for name, latency in timings.items():
+        print(f"{name:<32}{latency * 1e6:.2f}")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,221 @@
+import json
+import logging
+import os
+import time
+from functools import lru_cache
+
+from verify_block.run import (
+    BITS_CACHE_SIZE,
+    decode_bits_field,
+    fetch_block_at_height,
+    fetch_last_block_height,
+)
+
+
+logging.basicConfig(
+    format="%(asctime)s %(levelname)-8s %(message)s",
+    level=logging.INFO,
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+# The difficulty is adjusted every 2016 blocks (~2 weeks): all the blocks of
+# such an epoch share the same "bits" field
+EPOCH_LENGTH = 2016
+
+# "bits" field of the genesis block, i.e., the easiest target allowed. The
+# difficulty expresses how much harder the current target is compared to it.
+MAX_TARGET_BITS = 0x1D00FFFF
+
+DEFAULT_TABLE_PATH = os.path.expanduser(
+    "~/.cache/bitcoin-learn/difficulty_epochs.json"
+)
+
+
+@lru_cache(maxsize=BITS_CACHE_SIZE)
+def get_epoch_stats(bits: int) -> tuple:
+    """
+    Derive the target, the difficulty and the expected number of hashes needed
+    to mine one block from the "bits" field.
+
+    :param bits: int - "bits" field shared by the blocks of an epoch
+    :return: tuple - target, difficulty, expected hashes per block
+    """
+    target = decode_bits_field(bits)
+    difficulty = decode_bits_field(MAX_TARGET_BITS) / target
+    # A hash is valid if it's <= target: target + 1 valid values out of 2**256
+    expected_hashes = 2**256 // (target + 1)
+    return target, difficulty, expected_hashes
+
+
+class DifficultyTable:
+    """
+    Local table of the difficulty epochs of the chain, indexed by epoch number
+    (i.e., height // EPOCH_LENGTH)
+    """
+
+    def __init__(
+        self, epoch_bits: list[int] = None, last_height: int = None
+    ) -> None:
+        """
+        :param epoch_bits: list[int] - "bits" field of each epoch, in order
+        :param last_height: int - height of the latest block known when the
+                                  table was last updated
+        """
+        self.last_height = last_height
+        self.epoch_bits = []
+        self.epochs = []
+        for bits in epoch_bits or []:
+            self.append(bits)
+
+    def append(self, bits: int) -> None:
+        target, difficulty, expected_hashes = get_epoch_stats(bits)
+        epoch = len(self.epochs)
+        self.epoch_bits.append(bits)
+        self.epochs.append(
+            {
+                "epoch": epoch,
+                "start_height": epoch * EPOCH_LENGTH,
+                "end_height": (epoch + 1) * EPOCH_LENGTH - 1,
+                "bits": bits,
+                "target": target,
+                "difficulty": difficulty,
+                "expected_hashes": expected_hashes,
+            }
+        )
+
+    @property
+    def max_height(self) -> int:
+        return len(self.epochs) * EPOCH_LENGTH - 1
+
+    @classmethod
+    def load(cls, path: str) -> "DifficultyTable":
+        with open(path) as file:
+            data = json.load(file)
+        return cls(data["epoch_bits"], data.get("last_height"))
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as file:
+            json.dump(
+                {"epoch_bits": self.epoch_bits, "last_height": self.last_height},
+                file,
+            )
+
+    def update(self, last_height: int = None) -> int:
+        """
+        Fetch the "bits" field of the epochs missing from the table, up to the
+        epoch containing <last_height> (if None, the latest block's height).
+
+        :return: int - number of epochs added
+        """
+        if last_height is None:
+            last_height = fetch_last_block_height()
+        last_epoch = last_height // EPOCH_LENGTH
+
+        added = 0
+        for epoch in range(len(self.epochs), last_epoch + 1):
+            logger.info(f"Fetching epoch {epoch}/{last_epoch}...")
+            block = fetch_block_at_height(epoch * EPOCH_LENGTH)
+            self.append(block["bits"])
+            added += 1
+        self.last_height = max(self.last_height or 0, last_height)
+        return added
+
+    def query(self, from_height: int, to_height: int) -> dict:
+        """
+        Aggregate the difficulty data of the blocks in [from_height, to_height]
+        (both bounds included) from the table, without any network access.
+
+        :return: dict - epochs spanned by the range and expected hashes to mine
+                        all the blocks of the range
+        """
+        if from_height < 0 or from_height > to_height:
+            raise ValueError(
+                "Heights must verify 0 <= from_height <= to_height"
+            )
+        if to_height > self.max_height:
+            raise ValueError(
+                f"Height {to_height} is beyond the table's last epoch (up to"
+                f" height {self.max_height}), update the table first"
+            )
+
+        epochs = []
+        total_expected_hashes = 0
+        for epoch in self.epochs[
+            from_height // EPOCH_LENGTH : to_height // EPOCH_LENGTH + 1
+        ]:
+            # Number of blocks of the range that belong to this epoch
+            n_blocks = (
+                min(to_height, epoch["end_height"])
+                - max(from_height, epoch["start_height"])
+                + 1
+            )
+            total_expected_hashes += n_blocks * epoch["expected_hashes"]
+            epochs.append({**epoch, "n_blocks": n_blocks})
+
+        return {
+            "epochs": epochs,
+            "total_expected_hashes": total_expected_hashes,
+        }
+
+
+def difficulty(
+    from_height: int = None,
+    to_height: int = None,
+    update: bool = False,
+    table_path: str = DEFAULT_TABLE_PATH,
+) -> dict:
+    """
+    Report the target, difficulty and expected number of hashes of the blocks
+    in a range of heights, using a local table of the difficulty epochs.
+
+    :param from_height: int - first height of the range (if None, to_height)
+    :param to_height: int - last height of the range (if None, the latest
+                            block's height when the table was last updated)
+    :param update: bool - fetch the epochs missing from the local table first
+    :param table_path: str - path of the local table
+    """
+    if os.path.exists(table_path):
+        table = DifficultyTable.load(table_path)
+    else:
+        logger.info(f"No table found at {table_path}, creating a new one.")
+        table = DifficultyTable()
+        update = True
+
+    if update:
+        added = table.update()
+        table.save(table_path)
+        logger.info(f"{added} epoch(s) added to the table.")
+
+    if to_height is None:
+        to_height = table.last_height
+    if from_height is None:
+        from_height = to_height
+
+    start_time = time.perf_counter()
+    results = table.query(from_height, to_height)
+    end_time = time.perf_counter()
+
+    print(
+        "\n###########################\n"
+        "### Difficulty by Epoch ###\n"
+        "###########################\n"
+        f"{'Epoch':<7} {'Heights':<17} {'Blocks':<7} {'Bits':<11}"
+        f" {'Difficulty':<22} {'Expected hashes/block'}\n"
+        f"{'-'*90}"
+    )
+    for epoch in results["epochs"]:
+        heights = f"{epoch['start_height']}-{epoch['end_height']}"
+        print(
+            f"{epoch['epoch']:<7} {heights:<17} {epoch['n_blocks']:<7}"
+            f" {epoch['bits']:<#11x} {epoch['difficulty']:<22.2f}"
+            f" {epoch['expected_hashes']:.3e}"
+        )
+    print(
+        f"\n{'Total expected hashes:':<24}"
+        f"{results['total_expected_hashes']:.3e}\n"
+        f"{'Query time:':<24}{(end_time - start_time) * 1e6:.1f} µs"
+    )
+
+    return results
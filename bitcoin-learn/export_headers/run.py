@@ -0,0 +1,259 @@
+import logging
+import mmap
+import statistics
+import struct
+import sys
+from array import array
+from collections import Counter
+
+from verify_block.run import verify_block_range
+
+
+logging.basicConfig(
+    format="%(asctime)s %(levelname)-8s %(message)s",
+    level=logging.INFO,
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+# File layout: a fixed-size header followed by one column per header field,
+# each column storing the values of all the blocks contiguously.
+# - header: magic bytes, format version, number of blocks, first height
+# - uint32 columns: 4 bytes per block, little-endian (swapped on big-endian
+#   hosts, little-endian ones read them without copying)
+# - hash columns: 32 bytes per block, in the usual (displayed) byte order
+MAGIC = b"BLHC"
+FORMAT_VERSION = 1
+FILE_HEADER = struct.Struct("<4sIII")
+UINT32_COLUMNS = ("ver", "time", "bits", "nonce")
+HASH_COLUMNS = ("hash", "prev_block", "mrkl_root")
+HASH_SIZE = 32
+
+SCANS = ("nonces", "intervals")
+
+# The uint32 columns are handled as array("I") / memoryview.cast("I") which use
+# the native item size and byte order
+assert array("I").itemsize == 4, "array('I') items must be 4 bytes long"
+SWAP_BYTES = sys.byteorder == "big"
+
+
+class HeaderColumnsWriter:
+    """
+    Preallocated columns of a range of block headers, filled in any order as
+    the blocks come in, then written to a columnar file.
+    """
+
+    def __init__(self, first_height: int, n_blocks: int) -> None:
+        """
+        :param first_height: int - height of the first block
+        :param n_blocks: int - number of consecutive blocks
+        """
+        self.first_height = first_height
+        self.n_blocks = n_blocks
+        self.uint32_columns = {
+            name: array("I", bytes(4 * n_blocks)) for name in UINT32_COLUMNS
+        }
+        self.hash_columns = {
+            name: bytearray(HASH_SIZE * n_blocks) for name in HASH_COLUMNS
+        }
+
+    def set_block(self, block: dict) -> None:
+        """
+        :param block: dict - header fields and height of a block of the range
+        """
+        index = block["height"] - self.first_height
+        for name, column in self.uint32_columns.items():
+            column[index] = block[name]
+        for name, column in self.hash_columns.items():
+            column[index * HASH_SIZE : (index + 1) * HASH_SIZE] = (
+                bytes.fromhex(block[name])
+            )
+
+    def write(self, path: str) -> None:
+        with open(path, "wb") as file:
+            file.write(
+                FILE_HEADER.pack(
+                    MAGIC, FORMAT_VERSION, self.n_blocks, self.first_height
+                )
+            )
+            for column in self.uint32_columns.values():
+                if SWAP_BYTES:
+                    column = array("I", column)
+                    column.byteswap()
+                column.tofile(file)
+            for column in self.hash_columns.values():
+                file.write(column)
+
+
+class HeaderColumns:
+    """
+    Read-only, memory-mapped view of a columnar file of block headers. Columns
+    are exposed as memoryviews so scans don't copy nor parse the data: they
+    must be released (e.g., deleted) before the file is closed, closing it
+    otherwise raises a BufferError.
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as file:
+            self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.mmap) < FILE_HEADER.size:
+            raise ValueError(f"{path} is not a columnar file of headers")
+
+        magic, version, self.n_blocks, self.first_height = (
+            FILE_HEADER.unpack_from(self.mmap)
+        )
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a columnar file of headers")
+        expected_size = FILE_HEADER.size + self.n_blocks * (
+            4 * len(UINT32_COLUMNS) + HASH_SIZE * len(HASH_COLUMNS)
+        )
+        if len(self.mmap) != expected_size:
+            raise ValueError(
+                f"{path} is {len(self.mmap)} bytes long instead of the"
+                f" {expected_size} bytes its header implies"
+            )
+
+        # Offset of each column in the file
+        self.offsets = {}
+        offset = FILE_HEADER.size
+        for name in UINT32_COLUMNS:
+            self.offsets[name] = offset
+            offset += 4 * self.n_blocks
+        for name in HASH_COLUMNS:
+            self.offsets[name] = offset
+            offset += HASH_SIZE * self.n_blocks
+
+    def column(self, name: str) -> memoryview:
+        """
+        :param name: str - name of the column
+        :return: memoryview - values of the column (ints for the uint32
+                              columns, raw bytes for the hash columns). On
+                              big-endian hosts, uint32 columns are returned as
+                              byteswapped array copies instead. The view must
+                              be released before closing the file.
+        """
+        view = memoryview(self.mmap)[self.offsets[name] :]
+        if name in UINT32_COLUMNS:
+            if SWAP_BYTES:
+                values = array("I")
+                values.frombytes(view[: 4 * self.n_blocks])
+                values.byteswap()
+                return values
+            return view[: 4 * self.n_blocks].cast("I")
+        return view[: HASH_SIZE * self.n_blocks]
+
+    def get_hash(self, name: str, index: int) -> str:
+        """
+        :return: str - hex value of the hash column <name> for the block at
+                       position <index>
+        """
+        column = self.column(name)
+        return column[index * HASH_SIZE : (index + 1) * HASH_SIZE].hex()
+
+    def close(self) -> None:
+        self.mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def scan_nonces(columns: HeaderColumns, n_buckets: int = 16) -> dict:
+    """
+    Distribution of the nonces over <n_buckets> equal ranges of the 32-bit
+    nonce space.
+
+    :return: dict - number of blocks by bucket index
+    """
+    if n_buckets & (n_buckets - 1) or not 0 < n_buckets <= 2**32:
+        raise ValueError("n_buckets must be a power of 2")
+    # The bucket of a nonce is given by its most significant bits
+    shift = 32 - (n_buckets.bit_length() - 1)
+    counts = Counter(nonce >> shift for nonce in columns.column("nonce"))
+    return {bucket: counts[bucket] for bucket in range(n_buckets)}
+
+
+def scan_intervals(columns: HeaderColumns) -> dict:
+    """
+    Statistics of the time between consecutive blocks, in seconds. Block
+    timestamps are not strictly increasing so some intervals are negative.
+    """
+    times = columns.column("time")
+    intervals = [b - a for a, b in zip(times, times[1:])]
+    if not intervals:
+        raise ValueError("At least 2 blocks are needed")
+    return {
+        "mean": statistics.fmean(intervals),
+        "median": statistics.median(intervals),
+        "min": min(intervals),
+        "max": max(intervals),
+    }
+
+
+def export_headers(
+    from_height: int = None,
+    to_height: int = None,
+    source: str = None,
+    output_path: str = "headers.blhc",
+    workers: int = None,
+    scan: str = None,
+) -> dict:
+    """
+    Verify the blocks in [from_height, to_height] and export their headers to a
+    compact columnar file, or, if <scan> is provided, scan an exported file.
+
+    :param from_height: int - first height of the range
+    :param to_height: int - last height of the range
+    :param source: str - directory of <height>.json files to read the blocks
+                         from (if None, blockchain.info)
+    :param output_path: str - path of the columnar file
+    :param workers: int - number of verification processes (if None, one per
+                          CPU)
+    :param scan: str - scan to run on the file at <output_path> instead of
+                       exporting: "nonces" (distribution of the nonces) or
+                       "intervals" (time between blocks)
+    """
+    if scan is not None:
+        if scan not in SCANS:
+            raise ValueError(f"scan must be one of {SCANS}")
+        with HeaderColumns(output_path) as columns:
+            results = (
+                scan_nonces(columns)
+                if scan == "nonces"
+                else scan_intervals(columns)
+            )
+            title = (
+                f"Scan of {scan} over blocks {columns.first_height} to"
+                f" {columns.first_height + columns.n_blocks - 1}"
+            )
+        print(f"\n{title}\n{'-' * len(title)}")
+        for key, value in results.items():
+            print(f"{key:<10} {value}")
+        return results
+
+    if from_height is None or to_height is None:
+        raise ValueError("from_height and to_height must be provided")
+
+    writer = HeaderColumnsWriter(from_height, to_height - from_height + 1)
+    failed_heights = []
+    for results in verify_block_range(
+        from_height, to_height, source, verify_workers=workers
+    ):
+        if "error" in results or not (
+            results["hash_matches"] and results["hash_lt_target"]
+        ):
+            failed_heights.append(results["height"])
+        else:
+            writer.set_block(results)
+    if failed_heights:
+        raise ValueError(
+            f"Blocks at heights {sorted(failed_heights)} failed verification"
+        )
+
+    writer.write(output_path)
+    logger.info(
+        f"{writer.n_blocks} verified headers exported to {output_path}."
+    )
+    return {"n_blocks": writer.n_blocks, "output_path": output_path}
@@ -0,0 +1,200 @@
+import hashlib
+import logging
+import time
+from functools import cache
+from operator import methodcaller
+
+
+logging.basicConfig(
+    format="%(asctime)s %(levelname)-8s %(message)s",
+    level=logging.INFO,
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+# Number of inputs hashed per call during the benchmark, and number of calls
+BENCHMARK_BATCH_SIZE = 1024
+BENCHMARK_ROUNDS = 20
+
+# A backend is only preferred over the ones listed before it (i.e., simpler
+# ones) if it's faster by more than this share, so that benchmark noise doesn't
+# change the selected backend from one run to the next
+SELECTION_MARGIN = 0.1
+
+
+class HashBackend:
+    """
+    SHA-256 implementation exposed through a batched interface: many inputs
+    sharing a common prefix are hashed per call, which amortizes the Python
+    overhead and lets implementations reuse the prefix's internal state.
+    """
+
+    def __init__(self, name: str, sha256_many) -> None:
+        """
+        :param name: str - name of the implementation
+        :param sha256_many: callable - function (suffixes, prefix) -> digests
+                                       hashing each prefix + suffix
+        """
+        self.name = name
+        self._sha256_many = sha256_many
+
+    def sha256_many(self, suffixes: list[bytes], prefix: bytes = b"") -> list:
+        """
+        :param suffixes: list[bytes] - inputs to hash, after <prefix>
+        :param prefix: bytes - start common to all the inputs
+        :return: list[bytes] - SHA-256 digest of each prefix + suffix
+        """
+        return self._sha256_many(suffixes, prefix)
+
+    def sha256(self, data: bytes) -> bytes:
+        return self._sha256_many([data], b"")[0]
+
+    def sha256d(self, data: bytes) -> bytes:
+        """
+        Double SHA-256, as used by Bitcoin to hash block headers
+        """
+        return self.sha256(self.sha256(data))
+
+
+def _hashlib_sha256_many(suffixes, prefix):
+    return [hashlib.sha256(prefix + suffix).digest() for suffix in suffixes]
+
+
+def _hashlib_batched_sha256_many(suffixes, prefix):
+    # The prefix is hashed once, then its internal state (a.k.a. midstate) is
+    # copied for each input instead of hashing the prefix again. This only
+    # saves work when the prefix spans at least one 64-byte SHA-256 block, and
+    # the copy isn't free: with a 76-byte prefix, it's not faster than hashlib.
+    prefix_state = hashlib.sha256(prefix)
+
+    def hash_suffix(suffix):
+        state = prefix_state.copy()
+        state.update(suffix)
+        return state
+
+    return list(map(methodcaller("digest"), map(hash_suffix, suffixes)))
+
+
+def _cryptography_sha256_many(suffixes, prefix):
+    from cryptography.hazmat.primitives import hashes
+
+    prefix_state = hashes.Hash(hashes.SHA256())
+    prefix_state.update(prefix)
+    digests = []
+    for suffix in suffixes:
+        state = prefix_state.copy()
+        state.update(suffix)
+        digests.append(state.finalize())
+    return digests
+
+
+def get_available_backends() -> list[HashBackend]:
+    """
+    List the SHA-256 implementations available in this environment. hashlib
+    relies on OpenSSL which uses the CPU's SHA extensions (SHA-NI) when present.
+    The implementations are module-level functions so that backends can be
+    pickled (e.g., sent to worker processes).
+    """
+    backends = [
+        HashBackend("hashlib", _hashlib_sha256_many),
+        HashBackend("hashlib_batched", _hashlib_batched_sha256_many),
+    ]
+    try:
+        import cryptography  # noqa: F401
+
+        backends.append(
+            HashBackend("cryptography", _cryptography_sha256_many)
+        )
+    except ImportError:
+        logger.warning("cryptography is not installed, skipping its backend.")
+    return backends
+
+
+def benchmark_backend(
+    backend: HashBackend,
+    batch_size: int = BENCHMARK_BATCH_SIZE,
+    rounds: int = BENCHMARK_ROUNDS,
+) -> float:
+    """
+    Measure the hashing rate of a backend on inputs shaped like a block header
+    (76 bytes of fixed fields followed by a 4-byte nonce).
+
+    :return: float - hashes per second
+    """
+    prefix = bytes(76)
+    suffixes = [nonce.to_bytes(4, "little") for nonce in range(batch_size)]
+
+    # Check the backend against the reference before timing it
+    expected = hashlib.sha256(prefix + suffixes[-1]).digest()
+    if backend.sha256_many(suffixes, prefix)[-1] != expected:
+        raise ValueError(f"Backend {backend.name} returned a wrong digest")
+
+    start_time = time.perf_counter()
+    for _ in range(rounds):
+        backend.sha256_many(suffixes, prefix)
+    end_time = time.perf_counter()
+
+    return batch_size * rounds / (end_time - start_time)
+
+
+@cache
+def benchmark_backends() -> list[tuple]:
+    """
+    Benchmark all the available backends (once per process).
+
+    :return: list[tuple] - (backend, hashes per second), fastest first
+    """
+    results = []
+    for backend in get_available_backends():
+        rate = benchmark_backend(backend)
+        logger.info(f"Hash backend {backend.name}: {rate:,.0f} hashes/s")
+        results.append((backend, rate))
+    return sorted(results, key=lambda result: result[1], reverse=True)
+
+
+@cache
+def get_hash_backend() -> HashBackend:
+    """
+    Select the fastest SHA-256 backend for this CPU, preferring the simplest
+    ones unless another is faster by more than SELECTION_MARGIN.
+    """
+    results = benchmark_backends()
+    fastest_rate = results[0][1]
+    order = [backend.name for backend in get_available_backends()]
+    backend, rate = min(
+        (
+            result
+            for result in results
+            if result[1] * (1 + SELECTION_MARGIN) >= fastest_rate
+        ),
+        key=lambda result: order.index(result[0].name),
+    )
+    logger.info(
+        f"Selected hash backend: {backend.name} ({rate:,.0f} hashes/s)"
+    )
+    return backend
+
+
+def hash_backend() -> dict:
+    """
+    Benchmark the available SHA-256 implementations and report the one used by
+    pow_iterate and verify_block.
+
+    :return: dict - hashes per second by backend name, fastest first
+    """
+    selected = get_hash_backend()
+
+    print(
+        "\n#############################\n"
+        "### SHA-256 Hash Backends ###\n"
+        "#############################\n"
+        f"{'Backend':<20} {'Hashes/s':>15}\n"
+        f"{'-'*36}"
+    )
+    for backend, rate in benchmark_backends():
+        print(
+            f"{backend.name:<20} {rate:>15,.0f}"
+            + (" (selected)" if backend is selected else "")
+        )
+
+    return {backend.name: rate for backend, rate in benchmark_backends()}
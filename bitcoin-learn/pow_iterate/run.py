@@ -1,7 +1,8 @@
-import hashlib
 import time
 import logging
 
+from hash_backend.run import get_hash_backend
+
 
 logging.basicConfig(
     format="%(asctime)s %(levelname)-8s %(message)s",
@@ -11,7 +12,9 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def pow_iterate(data: str = "Hello world!", difficulty: int = 5) -> tuple:
+def pow_iterate(
+    data: str = "Hello world!", difficulty: int = 5, batch_size: int = 1024
+) -> tuple:
     """
     Run a simplified proof of work algorithm to find a nonce such that the hash
     of the nonce appended to the data starts with 'difficulty' number of zero
@@ -19,35 +22,45 @@ def pow_iterate(data: str = "Hello world!", difficulty: int = 5) -> tuple:
 
     :param data: str - data to be hashed
     :param difficulty: int - number of zero bits the hash must start with
+    :param batch_size: int - number of nonces hashed per call to the hash
+                             backend
     :return: tuple - returns the nonce and the hash
     """
     logger.info(
         f'Starting proof of work iteration on "{data}" with difficulty {difficulty}...'
     )
+    backend = get_hash_backend()
+
+    # Encode the original data to bytes via UTF-8 once: only the nonce appended
+    # to it changes between attempts
+    prefix = data.encode("utf-8")
 
     nonce = 0
     start_time = time.time()
     while True:
-        # Append the nonce to the original data and encode it to bytes via UTF-8
-        input_data = f"{data}{nonce}".encode("utf-8")
-
-        hash_hex = hashlib.sha256(input_data).hexdigest()
-
-        # [2:] removes the '0b' prefix from the binary representation
-        # zfill(256) ensures the binary representation is 256 bits long
-        hash_binary = bin(int(hash_hex, 16))[2:].zfill(256)
-
-        # The difficulty is a threshold: starting with <difficulty> 0s means that
-        # the hash (in decimal) is lower than 2 ** (256 - difficulty)
-        if hash_binary.startswith("0" * difficulty):
-            end_time = time.time()
-            print(
-                "###############\n"
-                "### Results ###\n"
-                "###############\n"
-                f"{'First valid nonce found:':<26}{nonce}\n"
-                f"{'Hash:':<26}{hash_hex}\n"
-                f"{'Time taken:':<26}{round(end_time - start_time, 3)} seconds"
-            )
-            return nonce, hash_hex
-        nonce += 1
+        # Try a whole batch of nonces at once to amortize the cost of calling
+        # the hash backend
+        nonces = range(nonce, nonce + batch_size)
+        hashes = backend.sha256_many(
+            [str(candidate).encode("utf-8") for candidate in nonces], prefix
+        )
+
+        for nonce, hash_bytes in zip(nonces, hashes):
+            # The difficulty is a threshold: starting with <difficulty> 0s
+            # means that the hash (in decimal) is lower than
+            # 2 ** (256 - difficulty), i.e., that the hash has no 1s left once
+            # its last (256 - difficulty) bits are shifted out
+            if int.from_bytes(hash_bytes) >> (256 - difficulty) == 0:
+                end_time = time.time()
+                hash_hex = hash_bytes.hex()
+                print(
+                    "###############\n"
+                    "### Results ###\n"
+                    "###############\n"
+                    f"{'First valid nonce found:':<26}{nonce}\n"
+                    f"{'Hash:':<26}{hash_hex}\n"
+                    f"{'Hash backend:':<26}{backend.name}\n"
+                    f"{'Time taken:':<26}{round(end_time - start_time, 3)} seconds"
+                )
+                return nonce, hash_hex
+        nonce = nonces.stop
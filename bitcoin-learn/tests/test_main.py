@@ -1,16 +1,35 @@
+import hashlib
+import json
 import os
+import pickle
 import sys
 
+import pytest
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+
 # Allow imports from the parent directory
 dir_abspath = os.path.dirname(__file__)
 parent_dir_abspath = os.path.dirname(dir_abspath)
 sys.path.append(parent_dir_abspath)
 
-from verify_block.run import verify_block
+from verify_block.run import (
+    verify_block,
+    verify_block_hash,
+    decode_bits_field,
+    encode_target_to_bits,
+)
+from difficulty.run import DifficultyTable, difficulty
 from pow_iterate.run import pow_iterate
+from hash_backend.run import get_available_backends, hash_backend
 from convert_number.run import convert_number
+from export_headers.run import export_headers, HeaderColumns
+from transact.run import Wallet, KeyPool
 from compute_reorg_attack_probability.run import (
     compute_reorg_attack_probability,
+    get_reorg_attack_probability,
+    build_reorg_probability_table,
+    load_reorg_probability_table,
 )
 
 
@@ -32,6 +51,110 @@ def test_verify_block():
     assert verification_results["hash_lt_target"] == True
 
 
+GENESIS_BLOCK = {
+    "hash": "000000000019d6689c085ae165831e934ff763ae46a2a6c172b3f1b60a8ce26f",
+    "ver": 1,
+    "prev_block": "0" * 64,
+    "mrkl_root": (
+        "4a5e1e4baab89f3a32518a88c31bc87f618f76673e2cc77ab2127b7afdeda33b"
+    ),
+    "time": 1231006505,
+    "bits": 486604799,
+    "nonce": 2083236893,
+}
+
+
+def test_verify_block_range(tmp_path):
+    # Local store where the genesis block is repeated at every height, with
+    # the nonce of one of them tampered with and another one malformed
+    for height in range(200):
+        block = dict(
+            GENESIS_BLOCK, nonce=GENESIS_BLOCK["nonce"] + (height == 42)
+        )
+        if height == 7:
+            block["prev_block"] = "z" * 64
+        with open(tmp_path / f"{height}.json", "w") as file:
+            json.dump(block, file)
+
+    report_path = str(tmp_path / "report.jsonl")
+    summary = verify_block(
+        from_height=0,
+        to_height=199,
+        source=str(tmp_path),
+        report_path=report_path,
+        workers=2,
+    )
+    assert summary["n_blocks"] == 200
+    assert summary["failed_heights"] == [7, 42]
+    with open(report_path) as report:
+        results = [json.loads(line) for line in report]
+    assert sorted(result["height"] for result in results) == list(range(200))
+    malformed_result = next(
+        result for result in results if result["height"] == 7
+    )
+    assert "error" in malformed_result
+    assert verify_block_hash(GENESIS_BLOCK, verbose=False)["hash_matches"]
+
+
+def test_export_headers(tmp_path):
+    for height in range(10):
+        with open(tmp_path / f"{height}.json", "w") as file:
+            json.dump(GENESIS_BLOCK, file)
+
+    output_path = str(tmp_path / "headers.blhc")
+    assert export_headers(0, 9, str(tmp_path), output_path, workers=1) == {
+        "n_blocks": 10,
+        "output_path": output_path,
+    }
+    with HeaderColumns(output_path) as columns:
+        assert columns.n_blocks == 10
+        assert list(columns.column("nonce")) == [GENESIS_BLOCK["nonce"]] * 10
+        assert columns.get_hash("hash", 9) == GENESIS_BLOCK["hash"]
+        assert columns.get_hash("mrkl_root", 0) == GENESIS_BLOCK["mrkl_root"]
+
+    nonces = export_headers(output_path=output_path, scan="nonces")
+    # 2083236893 >> 28 == 7
+    assert nonces[7] == 10 and sum(nonces.values()) == 10
+    assert export_headers(output_path=output_path, scan="intervals") == {
+        "mean": 0.0,
+        "median": 0,
+        "min": 0,
+        "max": 0,
+    }
+
+    # Truncated file
+    with open(output_path, "r+b") as file:
+        file.truncate(os.path.getsize(output_path) - 32)
+    with pytest.raises(ValueError):
+        HeaderColumns(output_path)
+
+
+def test_bits_field_encoding():
+    target = 263561359269705708657179707992723614632672251070119936
+    assert encode_target_to_bits(target) == 0x1702C070
+    assert decode_bits_field(0x1702C070) == target
+    for bits in [0x1D00FFFF, 0x1B0404CB, 0x03123456, 0x02123400, 0x01120000]:
+        assert encode_target_to_bits(decode_bits_field(bits)) == bits
+    # Targets shorter than the mantissa (exponent <= 2)
+    for target in [0, 0x12, 0x1234, 0x7F]:
+        assert decode_bits_field(encode_target_to_bits(target)) == target
+
+
+def test_difficulty(tmp_path):
+    table_path = str(tmp_path / "difficulty_epochs.json")
+    DifficultyTable([0x1D00FFFF, 0x1D00FFFF, 0x1702C070], 4100).save(
+        table_path
+    )
+    results = difficulty(2000, 4100, table_path=table_path)
+    assert [epoch["n_blocks"] for epoch in results["epochs"]] == [16, 2016, 69]
+    assert results["epochs"][0]["difficulty"] == 1.0
+    assert (
+        results["total_expected_hashes"]
+        == (16 + 2016) * (2**256 // (decode_bits_field(0x1D00FFFF) + 1))
+        + 69 * (2**256 // (decode_bits_field(0x1702C070) + 1))
+    )
+
+
 def test_pow_iterate():
     assert pow_iterate("Hello world!", 5) == (
         23,
@@ -39,6 +162,26 @@ def test_pow_iterate():
     )
 
 
+def test_hash_backend():
+    expected = [
+        hashlib.sha256(b"Hello world!" + str(nonce).encode("utf-8")).digest()
+        for nonce in range(100)
+    ]
+    for backend in get_available_backends():
+        # Backends are sent to worker processes
+        backend = pickle.loads(pickle.dumps(backend))
+        assert (
+            backend.sha256_many(
+                [str(nonce).encode("utf-8") for nonce in range(100)],
+                b"Hello world!",
+            )
+            == expected
+        )
+    assert set(hash_backend()) == {
+        backend.name for backend in get_available_backends()
+    }
+
+
 def test_convert_number():
     assert convert_number(1101101100101, 2, 16) == "1B65"
     assert convert_number("A12F8", 16, 2) == "10100001001011111000"
@@ -58,6 +201,38 @@ def test_convert_number():
     )
 
 
+def test_wallet_keys(tmp_path):
+    key_pool = KeyPool()
+    with pytest.raises(ValueError):
+        key_pool.fill(0)
+    key_pool.fill(8)
+    assert len(key_pool) == 8
+    # The last 2 keys are generated on demand once the pool is drained
+    wallets = Wallet.bulk_create(10, key_pool)
+    assert len(key_pool) == 0
+    assert len({wallet.compressed_pub_key for wallet in wallets}) == 10
+    assert wallets[0].formatted_pub_key == Wallet.format_pub_key(
+        wallets[0].public_key
+    )
+    # Bulk created wallets share a single logger
+    assert len({wallet.logger for wallet in wallets}) == 1
+
+    keys_path = str(tmp_path / "keys.bin")
+    Wallet.save_keys(wallets, keys_path)
+    assert os.path.getsize(keys_path) == 10 * 65
+    loaded_wallets = Wallet.load_keys(keys_path)
+    assert [wallet.formatted_pub_key for wallet in loaded_wallets] == [
+        wallet.formatted_pub_key for wallet in wallets
+    ]
+    # The private key rebuilt on first use signs like the original one
+    tx = loaded_wallets[0].make_tx({"utxo": 0}, wallets[1].public_key)
+    wallets[0].public_key.verify(
+        tx["sender_signature"],
+        tx["hash_for_signature"],
+        ec.ECDSA(hashes.SHA256()),
+    )
+
+
 def test_compute_reorg_attack_probability():
     assert (
         compute_reorg_attack_probability(0.1, 4, "original")
@@ -67,3 +242,61 @@ def test_compute_reorg_attack_probability():
         compute_reorg_attack_probability(0.1, 4, "modified")
         == 0.00047279024929107894
     )
+
+
+def test_reorg_probability_table(tmp_path):
+    table_path = str(tmp_path / "reorg_probabilities.bin")
+    # A missing table is not built implicitly
+    assert (
+        compute_reorg_attack_probability(0.1, 4, "original", table_path)
+        == 0.0034552434664851736
+    )
+    assert not os.path.exists(table_path)
+
+    build_reorg_probability_table(table_path, 100, 10, workers=2)
+    table = load_reorg_probability_table(table_path)
+    assert (
+        compute_reorg_attack_probability(0.1, 4, "original", table_path)
+        == 0.0034552434664851736
+    )
+    assert (
+        compute_reorg_attack_probability(0.1, 4, "modified", table_path)
+        == 0.00047279024929107894
+    )
+    # Off the grid: exact fallback, or interpolation between 0.1 and 0.11
+    assert table.lookup(0.105, 4, "original") == get_reorg_attack_probability(
+        0.105, 4, "original"
+    )
+    for q in (0.105, 0.305):
+        for formula in ("original", "modified"):
+            exact = get_reorg_attack_probability(q, 4, formula)
+            interpolated = table.lookup(q, 4, formula, interpolate=True)
+            assert abs(interpolated - exact) / exact < 0.01
+    # Interpolation is reachable from the entry point
+    assert compute_reorg_attack_probability(
+        0.105, 4, "original", table_path, interpolate=True
+    ) == table.lookup(0.105, 4, "original", interpolate=True)
+    # No interpolation next to a probability of 0 (q = 0)
+    assert table.lookup(
+        0.005, 4, "original", interpolate=True
+    ) == get_reorg_attack_probability(0.005, 4, "original")
+    # Beyond the table's z range
+    assert table.lookup(0.1, 20, "original") == get_reorg_attack_probability(
+        0.1, 20, "original"
+    )
+
+    # Rebuilding the table replaces the file: the new one gets loaded while
+    # the one loaded before keeps working
+    build_reorg_probability_table(table_path, 20, 5, workers=1)
+    rebuilt_table = load_reorg_probability_table(table_path)
+    assert (rebuilt_table.q_resolution, rebuilt_table.z_max) == (20, 5)
+    assert rebuilt_table.lookup(0.1, 4, "original") == 0.0034552434664851736
+    assert table.lookup(0.1, 4, "original") == 0.0034552434664851736
+
+    # A truncated file is rejected
+    with open(table_path, "rb") as file:
+        data = file.read()
+    with open(table_path, "wb") as file:
+        file.write(data[:-8])
+    with pytest.raises(ValueError):
+        load_reorg_probability_table(table_path)
@@ -1,18 +1,26 @@
 import logging
-import time
+import struct
+from collections import OrderedDict, deque
+from functools import cached_property
 from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+from cryptography.hazmat.primitives.serialization import (
+    Encoding,
+    PublicFormat,
+)
 from cryptography.exceptions import InvalidSignature
 import hashlib
 
 
 def setup_logger(name, log_format):
     logger = logging.getLogger(name)
-    handler = logging.StreamHandler()
-    formatter = logging.Formatter(log_format)
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
+    # A logger is shared by all the objects using its name: only give it a
+    # handler once so that messages aren't duplicated
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        formatter = logging.Formatter(log_format)
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
     logger.setLevel(logging.INFO)
     logger.propagate = False
     return logger
@@ -23,16 +31,163 @@ logger = setup_logger(
     "NARRATIVE %(message)s",
 )
 
+# Shared by the wallets created in bulk, which don't log individually
+wallets_logger = setup_logger(
+    "Wallets",
+    "WALLETS %(message)s",
+)
 
-class Wallet:
-    def __init__(self):
-        self.logger = setup_logger(
-            f"Wallet-{id(self)}",
-            "WALLET %(message)s",
+# Number of public keys whose formatted representation is kept in memory
+FORMATTED_PUB_KEYS_CACHE_SIZE = 4096
+
+# Public keys are neither hashable nor weak-referenceable so they are cached by
+# id(). Each entry keeps a reference to its key so the id can't be reused by
+# another object while the entry exists.
+_formatted_pub_keys = OrderedDict()
+
+# Key file record: 32-byte private value followed by the 33-byte compressed
+# public key
+KEY_RECORD = struct.Struct("32s33s")
+
+
+class KeyPool:
+    """
+    Pool of SECP256K1 private keys generated ahead of a workload, so that get()
+    does no cryptographic work while the pool lasts.
+    The pool is filled explicitly, with fill(), while the caller is otherwise
+    idle (e.g., during setup): filling it in the background would compete with
+    the workload for the CPU. Generating keys in other processes doesn't pay off
+    either since sending a key back costs about as much as generating it.
+    """
+
+    def __init__(self) -> None:
+        self.keys = deque()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def fill(self, n: int) -> None:
+        """
+        :param n: int - number of keys to generate and add to the pool
+        """
+        if n < 1:
+            raise ValueError("n must be >= 1")
+        self.keys.extend(
+            ec.generate_private_key(ec.SECP256K1()) for _ in range(n)
         )
-        self.private_key = ec.generate_private_key(ec.SECP256K1())
+
+    def get(self):
+        """
+        :return: a private key from the pool, or a newly generated one if the
+                 pool is empty
+        """
+        try:
+            return self.keys.popleft()
+        except IndexError:
+            return ec.generate_private_key(ec.SECP256K1())
+
+
+class Wallet:
+    def __init__(self, private_key=None, logger: logging.Logger = None):
+        """
+        :param private_key: private key of the wallet (if None, a new one is
+                            generated)
+        :param logger: logging.Logger - logger shared with other wallets (if
+                       None, the wallet gets its own and logs its creation)
+        """
+        if private_key is None:
+            private_key = ec.generate_private_key(ec.SECP256K1())
+        self.private_key = private_key
         self.public_key = self.private_key.public_key()
-        self.logger.info("Wallet, private key, and public key created.")
+        if logger is None:
+            self.logger = setup_logger(
+                f"Wallet-{id(self)}",
+                "WALLET %(message)s",
+            )
+            self.logger.info("Wallet, private key, and public key created.")
+        else:
+            self.logger = logger
+
+    @cached_property
+    def private_key(self):
+        # Only reached by the wallets loaded with load_keys: their private key
+        # is rebuilt when it's first needed, i.e., when they first sign
+        return ec.EllipticCurvePrivateNumbers(
+            self.private_value,
+            self.public_key.public_numbers(),
+        ).private_key()
+
+    @cached_property
+    def private_value(self) -> int:
+        return self.private_key.private_numbers().private_value
+
+    @cached_property
+    def formatted_pub_key(self) -> str:
+        return self.format_pub_key(self.public_key)
+
+    @cached_property
+    def compressed_pub_key(self) -> bytes:
+        # 33 bytes: the x coordinate of the public key's point and a prefix
+        # indicating the parity of its y coordinate
+        return self.public_key.public_bytes(
+            Encoding.X962,
+            PublicFormat.CompressedPoint,
+        )
+
+    @classmethod
+    def bulk_create(cls, n: int, key_pool: KeyPool = None) -> list:
+        """
+        Create <n> wallets sharing a logger, taking their keys from <key_pool>
+        if provided.
+        """
+        if key_pool is None:
+            wallets = [cls(logger=wallets_logger) for _ in range(n)]
+        else:
+            wallets = [
+                cls(key_pool.get(), logger=wallets_logger) for _ in range(n)
+            ]
+        wallets_logger.info(f"{n} wallets created.")
+        return wallets
+
+    @staticmethod
+    def save_keys(wallets: list, path: str) -> None:
+        """
+        Save the keys of <wallets> to a file of fixed-size records (cf.
+        KEY_RECORD).
+        """
+        with open(path, "wb") as file:
+            for wallet in wallets:
+                file.write(
+                    KEY_RECORD.pack(
+                        wallet.private_value.to_bytes(32, "big"),
+                        wallet.compressed_pub_key,
+                    )
+                )
+
+    @classmethod
+    def load_keys(cls, path: str) -> list:
+        """
+        Create wallets sharing a logger from the keys saved by save_keys.
+        Only the public keys are decoded upfront. Rebuilding a private key
+        costs about as much as generating one, so it is deferred until the
+        wallet first signs.
+        """
+        with open(path, "rb") as file:
+            data = file.read()
+
+        wallets = []
+        for private_value, compressed_pub_key in KEY_RECORD.iter_unpack(data):
+            # Bypass __init__, which expects a private key
+            wallet = cls.__new__(cls)
+            wallet.logger = wallets_logger
+            wallet.private_value = int.from_bytes(private_value, "big")
+            wallet.compressed_pub_key = compressed_pub_key
+            wallet.public_key = ec.EllipticCurvePublicKey.from_encoded_point(
+                ec.SECP256K1(), compressed_pub_key
+            )
+            wallets.append(wallet)
+        wallets_logger.info(f"{len(wallets)} wallets loaded from {path}.")
+        return wallets
 
     def make_tx(self, utxo_to_spend: dict, recipient_pub_key):
         formatted_recipient_pub_key = self.format_pub_key(recipient_pub_key)
@@ -52,18 +207,27 @@ class Wallet:
 
     @staticmethod
     def format_pub_key(public_key):
-        return str(
+        cached = _formatted_pub_keys.get(id(public_key))
+        if cached is not None and cached[0] is public_key:
+            _formatted_pub_keys.move_to_end(id(public_key))
+            return cached[1]
+
+        formatted_pub_key = str(
             public_key.public_bytes(
                 Encoding.DER,
                 PublicFormat.SubjectPublicKeyInfo,
             )
         )
+        _formatted_pub_keys[id(public_key)] = (public_key, formatted_pub_key)
+        if len(_formatted_pub_keys) > FORMATTED_PUB_KEYS_CACHE_SIZE:
+            _formatted_pub_keys.popitem(last=False)
+        return formatted_pub_key
 
 
 class Node:
     def __init__(self):
         self.logger = setup_logger(
-            f"Wallet-{id(self)}",
+            f"Node-{id(self)}",
             "NODE %(message)s",
         )
 
@@ -1,9 +1,19 @@
 import requests
-import hashlib
+import json
+import os
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from functools import lru_cache
 from operator import rshift, lshift
 import logging
 import time
 
+from hash_backend.run import get_hash_backend
+
 
 logging.basicConfig(
     format="%(asctime)s %(levelname)-8s %(message)s",
@@ -12,6 +22,25 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Number of distinct "bits" values kept by the memoized decoder. The "bits"
+# field only changes once per difficulty epoch (2016 blocks), so this covers
+# every epoch of the chain so far with plenty of room.
+BITS_CACHE_SIZE = 1024
+
+# Fields of the block header, i.e., the fields needed to verify a block's hash
+HEADER_FIELDS = (
+    "hash",
+    "ver",
+    "prev_block",
+    "mrkl_root",
+    "time",
+    "bits",
+    "nonce",
+)
+
+# Number of blocks verified per task submitted to the verification processes
+VERIFY_CHUNK_SIZE = 64
+
 
 def fetch_last_block_hash() -> str:
     """
@@ -43,6 +72,37 @@ def get_type_and_size(value):
         raise ValueError(f"Unsupported type: {type(value)}")
 
 
+def fetch_last_block_height() -> int:
+    """
+    Fetch the height of the latest block from blockchain.info
+    :return: int - height of the latest block
+    """
+    url = "https://blockchain.info/latestblock?format=json"
+    response = requests.get(url)
+    return response.json()["height"]
+
+
+def fetch_block_at_height(height: int) -> dict:
+    """
+    Fetch the block of the main chain at a given height from blockchain.info
+    :param height: int - height of the block to fetch
+    :return: dict - block details
+    """
+    url = f"https://blockchain.info/block-height/{height}?format=json"
+    response = requests.get(url)
+    if response.status_code != 200:
+        raise Exception(
+            f"Failed to fetch block at height {height}: {response.text}"
+        )
+    # Orphaned blocks may also be returned, only keep the main chain's one
+    blocks = [
+        block
+        for block in response.json()["blocks"]
+        if block.get("main_chain", True)
+    ]
+    return blocks[0]
+
+
 def fetch_block_details(block_hash: str) -> dict:
     """
     Fetch detailed information for a given block by hash
@@ -139,6 +199,48 @@ def get_target_from_bits_field(bits: int):
     return target
 
 
+@lru_cache(maxsize=BITS_CACHE_SIZE)
+def decode_bits_field(bits: int) -> int:
+    """
+    Quiet and memoized counterpart of get_target_from_bits_field: obtain the
+    target from the "bits" field without logging the intermediate steps.
+    """
+    exponent = rshift(bits, 24)
+    mantissa = bits & 0xFFFFFF
+    # Targets shorter than the 3-byte mantissa are obtained by dropping its
+    # least significant bytes, as Bitcoin Core's SetCompact does
+    if exponent <= 3:
+        return rshift(mantissa, 8 * (3 - exponent))
+    return lshift(mantissa, 8 * (exponent - 3))
+
+
+def encode_target_to_bits(target: int) -> int:
+    """
+    Obtain the "bits" field (compact representation) from a target value.
+    This is the reverse of decode_bits_field, up to the precision loss of the
+    3-byte mantissa.
+    cf. https://developer.bitcoin.org/reference/block_chain.html#target-nbits
+    """
+    if target < 0:
+        raise ValueError("target must be positive")
+
+    # exponent = length (# of bytes) of the target value
+    exponent = (target.bit_length() + 7) // 8
+    if exponent <= 3:
+        mantissa = lshift(target, 8 * (3 - exponent))
+    else:
+        # Only the 3 most significant bytes are kept
+        mantissa = rshift(target, 8 * (exponent - 3))
+
+    # The mantissa is signed: if its most significant bit is set, it would be
+    # read as negative, so it is shifted by one byte and the exponent grows
+    if mantissa & 0x800000:
+        mantissa = rshift(mantissa, 8)
+        exponent += 1
+
+    return lshift(exponent, 24) | mantissa
+
+
 # Convert hex to bytes, reverse bytes' order, and convert back to hex for proper
 # endianess
 def reverse_hex(hex_str: str) -> str:
@@ -151,7 +253,7 @@ def int_to_hex_str(int: int) -> str:
     return int.to_bytes(4, byteorder="little").hex()
 
 
-def verify_block_hash(block):
+def verify_block_hash(block, verbose: bool = True):
     # Reconstruct the block header
     header_hex = (
         int_to_hex_str(block["ver"])
@@ -163,15 +265,22 @@ def verify_block_hash(block):
     )
 
     header_bytes = bytes.fromhex(header_hex)
-    reconstructed_hash = (
-        hashlib.sha256(hashlib.sha256(header_bytes).digest())
-        .digest()[::-1]
-        .hex()
-    )
+    reconstructed_hash = get_hash_backend().sha256d(header_bytes)[::-1].hex()
 
-    target = get_target_from_bits_field(block["bits"])
     hash_as_int = int(reconstructed_hash, 16)
 
+    if not verbose:
+        target = decode_bits_field(block["bits"])
+        return {
+            "reconstructed_hash": reconstructed_hash,
+            "hash_matches": reconstructed_hash == block["hash"],
+            "target": target,
+            "hash_as_int": hash_as_int,
+            "hash_lt_target": hash_as_int < target,
+        }
+
+    target = get_target_from_bits_field(block["bits"])
+
     print(
         "\n#########################\n"
         "### Hash Verification ###\n"
@@ -192,13 +301,243 @@ def verify_block_hash(block):
     }
 
 
-def verify_block(block_hash: str = None) -> None:
+def load_block_header(height: int, source: str = None) -> dict:
+    """
+    Load the header fields of the block at a given height.
+
+    :param height: int - height of the block
+    :param source: str - directory of <height>.json files holding the blocks
+                         as returned by blockchain.info (if None, the block is
+                         fetched from blockchain.info)
+    :return: dict - header fields and height of the block
+    """
+    if source is None:
+        block = fetch_block_at_height(height)
+    else:
+        with open(os.path.join(source, f"{height}.json")) as file:
+            block = json.load(file)
+    # Only keep the header: the transactions are not needed and would make the
+    # memory usage grow with the number of blocks in flight
+    return {
+        "height": height,
+        **{field: block[field] for field in HEADER_FIELDS},
+    }
+
+
+def verify_block_headers(blocks: list[dict]) -> list[dict]:
+    """
+    Verify a chunk of block headers quietly (meant to run in a worker process).
+
+    :return: list[dict] - header fields and verification results of each block
+    """
+    results = []
+    for block in blocks:
+        # A malformed block is reported like a block that couldn't be loaded
+        # rather than interrupting the verification of the whole range
+        try:
+            verification_results = verify_block_hash(block, verbose=False)
+        except Exception as e:
+            results.append({"height": block["height"], "error": str(e)})
+            continue
+        results.append(
+            {
+                **block,
+                "reconstructed_hash": verification_results[
+                    "reconstructed_hash"
+                ],
+                "hash_matches": verification_results["hash_matches"],
+                "hash_lt_target": verification_results["hash_lt_target"],
+            }
+        )
+    return results
+
+
+def select_hash_backend() -> str:
+    """
+    Select the hash backend of the current process (meant to start a worker
+    process).
+
+    :return: str - name of the selected backend
+    """
+    return get_hash_backend().name
+
+
+def _run_verification_pipeline(
+    heights, source, max_in_flight, fetch_executor, verify_executor
+):
+    # Futures mapped to the height (loading) or the number of blocks
+    # (verification) they cover
+    loadings = {}
+    verifications = {}
+    loaded_blocks = []
+
+    while True:
+        in_flight = (
+            len(loadings) + len(loaded_blocks) + sum(verifications.values())
+        )
+        while in_flight < max_in_flight:
+            height = next(heights, None)
+            if height is None:
+                break
+            future = fetch_executor.submit(load_block_header, height, source)
+            loadings[future] = height
+            in_flight += 1
+
+        # Submit full chunks, or whatever is left once loading is over
+        while len(loaded_blocks) >= VERIFY_CHUNK_SIZE or (
+            loaded_blocks and not loadings
+        ):
+            chunk = loaded_blocks[:VERIFY_CHUNK_SIZE]
+            del loaded_blocks[:VERIFY_CHUNK_SIZE]
+            future = verify_executor.submit(verify_block_headers, chunk)
+            verifications[future] = len(chunk)
+
+        if not loadings and not verifications:
+            return
+
+        done, _ = wait(
+            [*loadings, *verifications], return_when=FIRST_COMPLETED
+        )
+        for future in done:
+            if future in loadings:
+                height = loadings.pop(future)
+                try:
+                    loaded_blocks.append(future.result())
+                except Exception as e:
+                    yield {"height": height, "error": str(e)}
+            else:
+                del verifications[future]
+                yield from future.result()
+
+
+def verify_block_range(
+    from_height: int,
+    to_height: int,
+    source: str = None,
+    fetch_workers: int = 8,
+    verify_workers: int = None,
+):
+    """
+    Verify the blocks in [from_height, to_height] (both bounds included),
+    loading blocks in threads while verifying already loaded ones in processes.
+    The number of blocks in flight is bounded so memory usage doesn't depend on
+    the size of the range.
+
+    :param from_height: int - first height of the range
+    :param to_height: int - last height of the range
+    :param source: str - cf. load_block_header
+    :param fetch_workers: int - number of threads loading blocks
+    :param verify_workers: int - number of processes verifying blocks (if None,
+                                 one per CPU)
+    :return: generator - results of each block, in completion order. A block
+                         that couldn't be loaded or verified gets an "error"
+                         field.
+    """
+    heights = iter(range(from_height, to_height + 1))
+    max_in_flight = 4 * VERIFY_CHUNK_SIZE * (verify_workers or os.cpu_count())
+
+    # Select the hash backend before the worker processes are forked so that
+    # they inherit it rather than each benchmarking the backends again
+    get_hash_backend()
+
+    with ProcessPoolExecutor(verify_workers) as verify_executor:
+        # Start the worker processes now: forking once the loading threads are
+        # running could deadlock the children
+        verify_executor.submit(select_hash_backend).result()
+        with ThreadPoolExecutor(fetch_workers) as fetch_executor:
+            yield from _run_verification_pipeline(
+                heights, source, max_in_flight, fetch_executor, verify_executor
+            )
+
+
+def verify_block_heights(
+    from_height: int,
+    to_height: int,
+    source: str = None,
+    report_path: str = "verify_block_report.jsonl",
+    workers: int = None,
+) -> dict:
+    """
+    Verify the blocks in [from_height, to_height], stream the results of each
+    block to a JSON-lines report, and print a summary.
+
+    :return: dict - summary of the run
+    """
+    logger.info(
+        f"Verifying blocks {from_height} to {to_height}, reporting to"
+        f" {report_path}..."
+    )
+    n_blocks = 0
+    failed_heights = []
+    start_time = time.time()
+    with open(report_path, "w") as report:
+        for results in verify_block_range(
+            from_height, to_height, source, verify_workers=workers
+        ):
+            report.write(json.dumps(results) + "\n")
+            n_blocks += 1
+            if "error" in results or not (
+                results["hash_matches"] and results["hash_lt_target"]
+            ):
+                failed_heights.append(results["height"])
+    end_time = time.time()
+
+    failed_heights.sort()
+    blocks_per_second = n_blocks / (end_time - start_time)
+    print(
+        "\n################################\n"
+        "### Block Range Verification ###\n"
+        "################################\n"
+        f"{'Blocks verified:':<20}{n_blocks}\n"
+        f"{'Failures:':<20}{len(failed_heights)}"
+        + (f" (heights: {failed_heights})" if failed_heights else "")
+        + "\n"
+        f"{'Time taken:':<20}{round(end_time - start_time, 3)} seconds\n"
+        f"{'Throughput:':<20}{blocks_per_second:.1f} blocks/s\n"
+        f"{'Report:':<20}{report_path}"
+    )
+
+    return {
+        "n_blocks": n_blocks,
+        "failed_heights": failed_heights,
+        "blocks_per_second": blocks_per_second,
+    }
+
+
+def verify_block(
+    block_hash: str = None,
+    from_height: int = None,
+    to_height: int = None,
+    source: str = None,
+    report_path: str = "verify_block_report.jsonl",
+    workers: int = None,
+) -> None:
     """
     Verify a block's hash by comparing it to the hash reconstructed from the
     block's header fields and checking if it meets the difficulty target.
+    If a range of heights is provided, verify all the blocks in that range
+    instead.
 
     :param block_hash: str - hash of the block to verify (if None, the latest)
+    :param from_height: int - first height of the range to verify (if None,
+                              to_height)
+    :param to_height: int - last height of the range to verify (if None, the
+                            latest block's height)
+    :param source: str - directory of <height>.json files to read the blocks
+                         of the range from (if None, blockchain.info)
+    :param report_path: str - path of the JSON-lines report of the range
+    :param workers: int - number of verification processes (if None, one per
+                          CPU)
     """
+    if from_height is not None or to_height is not None:
+        if to_height is None:
+            to_height = fetch_last_block_height()
+        if from_height is None:
+            from_height = to_height
+        return verify_block_heights(
+            from_height, to_height, source, report_path, workers
+        )
+
     if not block_hash:
         logger.info("No block hash provided. Using the latest block hash.")
         block_hash = fetch_last_block_hash()